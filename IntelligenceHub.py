@@ -1,4 +1,5 @@
 import os
+import heapq
 import random
 import time
 import traceback
@@ -240,6 +241,9 @@ class IntelligenceHub:
         if self.mongo_db_archive:
             self.mongo_db_archive.close()
 
+        if self.mongo_db_recommendation:
+            self.mongo_db_recommendation.close()
+
     # ---------------------------------------------- Statistics and Debug ----------------------------------------------
 
     @property
@@ -371,17 +375,40 @@ class IntelligenceHub:
         fulltext_result = []
 
         # 2. 独立查询 (Best Effort Strategy)
-        if in_summary:
-            if engine_summary:
-                summary_result = engine_summary.query(text, top_n, score_threshold)
-            else:
-                logger.warning("Summary search requested but engine is not ready yet.")
+        run_fulltext = in_fulltext and bool(engine_full)
+        run_summary = in_summary and bool(engine_summary)
 
-        if in_fulltext:
-            if engine_full:
-                fulltext_result = engine_full.query(text, top_n, score_threshold)
+        if in_fulltext and not engine_full:
+            logger.warning("Fulltext search requested but engine is not ready yet.")
+        if in_summary and not engine_summary:
+            logger.warning("Summary search requested but engine is not ready yet.")
+
+        # Both searches are independent round trips to the VectorDB service: when both run, overlap them.
+        # One short-lived thread per call, so concurrent requests never queue behind each other.
+        fulltext_thread = None
+        fulltext_outcome = {}
+
+        def _query_fulltext():
+            try:
+                fulltext_outcome['result'] = engine_full.query(text, top_n, score_threshold)
+            except Exception as e:
+                fulltext_outcome['error'] = e
+
+        if run_fulltext:
+            if run_summary:
+                fulltext_thread = threading.Thread(target=_query_fulltext, name='FullTextSearch', daemon=True)
+                fulltext_thread.start()
             else:
-                logger.warning("Fulltext search requested but engine is not ready yet.")
+                fulltext_result = engine_full.query(text, top_n, score_threshold)
+
+        if run_summary:
+            summary_result = engine_summary.query(text, top_n, score_threshold)
+
+        if fulltext_thread is not None:
+            fulltext_thread.join()
+            if 'error' in fulltext_outcome:
+                raise fulltext_outcome['error']
+            fulltext_result = fulltext_outcome['result']
 
         # 如果两个都没查（或者都不可用），直接返回
         if not summary_result and not fulltext_result:
@@ -398,21 +425,17 @@ class IntelligenceHub:
 
             if doc_id is None: continue
 
-            if doc_id not in best_records or score > best_records[doc_id][0]:
+            best = best_records.get(doc_id)
+            if best is None or score > best[0]:
                 best_records[doc_id] = (score, result)
 
-        # 4. 转换格式 -> [(doc_id, score, result_dict)]
-        result_list = [
+        # 4. 排序与截断 (Top-N) -> [(doc_id, score, result_dict)]
+        # 合并后的结果必须重新按分数降序排列，并只取前 N 个; nlargest avoids sorting the whole merged list
+        return [
             (doc_id, val[0], val[1])
-            for doc_id, val in best_records.items()
+            for doc_id, val in heapq.nlargest(top_n, best_records.items(), key=lambda item: item[1][0])
         ]
 
-        # 5. 排序与截断 (Sort & Slice)
-        # 合并后的结果必须重新按分数降序排列，并只取前 N 个
-        result_list.sort(key=lambda x: x[1], reverse=True)
-
-        return result_list[:top_n]
-
     def get_intelligence_summary(self) -> Tuple[int, str]:
         query_engine = self.archive_db_query_engine
         summary = query_engine.get_intelligence_summary()
@@ -1,15 +1,26 @@
+import copy
 import json
+import functools
+import itertools
+import time
 import logging
 import datetime
 import calendar
 import os
+import asyncio
+import tempfile
+import threading
 from pathlib import Path
-from bson import ObjectId
-from typing import Dict, Optional, List, Any, Sequence, Union, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId, decode_all, encode as bson_encode
+from bson.codec_options import CodecOptions
+from bson.errors import InvalidId
+from typing import Dict, Optional, List, Any, Sequence, Union, Tuple, Iterator, Iterable, AsyncIterator
 from pymongo.database import Database
 from pymongo.collection import Collection
 from pymongo.errors import PyMongoError
-from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel, UpdateMany
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # --- Timezone Setup ---
@@ -25,22 +36,317 @@ except (ImportError, ZoneInfoNotFoundError):
     print("Warning: tzlocal not found or local timezone could not be determined. Falling back to UTC.")
     LOCAL_TZ = UTC
 
+
+def _detect_fixed_offset_tz(tz: datetime.tzinfo) -> datetime.tzinfo:
+    """
+    Returns a constant-offset timezone equivalent to tz if tz had no DST/offset change
+    between 2000 and 2030, otherwise tz itself. A fixed offset skips ZoneInfo's
+    transition lookup on every conversion.
+    """
+    offsets = {tz.utcoffset(datetime.datetime(year, month, 1)) for year in range(2000, 2030) for month in (1, 7)}
+    if len(offsets) == 1:
+        return datetime.timezone(offsets.pop())
+    return tz
+
+
+# Only valid from FAST_TZ_SINCE_YEAR on: zones like Asia/Shanghai observed DST in earlier decades.
+# Internal use only (naive -> UTC on input): outputs always carry LOCAL_TZ, like the C decoder's results.
+LOCAL_TZ_FAST = _detect_fixed_offset_tz(LOCAL_TZ)
+FAST_TZ_SINCE_YEAR = 2000
+
+
+def _utc_to_local(dt: datetime.datetime, _local=LOCAL_TZ) -> datetime.datetime:
+    """
+    Converts an aware datetime to local time. Every read path returns the same zone object (LOCAL_TZ).
+    The underscore default binds the module constant as a local (no global lookup per call).
+    """
+    return dt.astimezone(_local)
+
+
+# orjson serializes datetimes in C and emits UTF-8 bytes directly. Optional: fall back to stdlib json.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Native asyncio driver (pymongo >= 4.10). Optional: only AsyncMongoDBStorage needs it.
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:
+    AsyncMongoClient = None
+
 logger = logging.getLogger(__name__)
 
 IndexSpec = Sequence[Tuple[str, Union[int, str]]]
 
+# Sentinel for query cache misses (None is a legitimate cached find_one result)
+_CACHE_MISS = object()
+
+
+# Documents per insert_many call in bulk_insert
+BULK_INSERT_CHUNK_SIZE = 10000
+
+# Write buffer for export files
+EXPORT_WRITE_BUFFER_SIZE = 1 << 20
+# Server batch size of export cursors (the driver default is 101 docs for the first batch).
+# Exports decode and encode one server batch at a time, so this also bounds export memory.
+EXPORT_CURSOR_BATCH_SIZE = 5000
+# Unique suffix source for export temp files (next() on itertools.count is atomic under the GIL)
+_EXPORT_TMP_COUNTER = itertools.count()
+
+# Process-wide MongoClient cache: (uri, pool size, client kwargs) -> [MongoClient, reference count]
+_CLIENT_CACHE: Dict[tuple, list] = {}
+_CLIENT_CACHE_LOCK = threading.Lock()
+
+# Query cache generation per collection: (client key, db name, collection name) -> write count.
+# Shared by all handlers of a collection, so a write through one invalidates every handler's cache.
+_CACHE_GENERATIONS: Dict[tuple, int] = {}
+_CACHE_GENERATIONS_LOCK = threading.Lock()
 
 # Custom Encoder to handle datetime and ObjectId for JSON serialization
 class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime.datetime):
+    def default(self, obj, _datetime=datetime.datetime, _oid=ObjectId):
+        # Exact type checks first (datetimes are the most frequent), defaults bind the types as locals
+        t = type(obj)
+        if t is _datetime:
             # Return ISO 8601 formatted string
             return obj.isoformat()
-        if isinstance(obj, ObjectId):
-            return str(obj)
+        if t is _oid:
+            return obj.binary.hex()
+        if isinstance(obj, _datetime):      # Subclasses, e.g. pandas.Timestamp
+            return obj.isoformat()
         return super().default(obj)
 
 
+@functools.lru_cache(maxsize=256)
+def _split_path(path: str) -> Tuple[str, ...]:
+    """Splits a dot notation field path once, e.g. 'APPENDIX.time_archived' -> ('APPENDIX', 'time_archived')."""
+    return tuple(path.split('.'))
+
+
+def _orjson_default(obj):
+    """orjson hook for types it can't serialize natively."""
+    if isinstance(obj, ObjectId):
+        return obj.binary.hex()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _dumps_json(doc: Any) -> bytes:
+    """Serializes a processed document to UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(doc, default=_orjson_default)
+    return json.dumps(doc, cls=DateTimeEncoder, ensure_ascii=False).encode('utf-8')
+
+
+def _dumps_json_items(docs: List[Any]) -> bytes:
+    """
+    Serializes documents as the comma separated items of a JSON array (no brackets).
+    With orjson the whole batch is encoded in a single C call.
+    """
+    if orjson is not None:
+        return orjson.dumps(docs, default=_orjson_default)[1:-1]
+    return b',\n'.join([_dumps_json(doc) for doc in docs])
+
+
+# --- Document normalization helpers, shared by MongoDBStorage and AsyncMongoDBStorage ---
+
+def _normalize_to_utc(dt: datetime.datetime,
+                      _utc=UTC, _local=LOCAL_TZ, _local_fast=LOCAL_TZ_FAST,
+                      _fast_since=FAST_TZ_SINCE_YEAR) -> datetime.datetime:
+    """
+    Converts a datetime object to timezone-aware UTC.
+    The underscore defaults bind module constants as locals (no global lookups per call).
+    """
+    tz = dt.tzinfo
+    if tz is _utc:
+        # Already UTC (the common case for application data): nothing to convert
+        return dt
+    if tz is None:
+        # Assume naive datetime is in local timezone
+        return dt.replace(tzinfo=_local_fast if dt.year >= _fast_since else _local).astimezone(_utc)
+    # If already aware, just convert to UTC
+    return dt.astimezone(_utc)
+
+
+def _walk_dates(root: Any, conversion_func: callable) -> Any:
+    """
+    Returns root with conversion_func applied to every datetime. Copy-on-write: only the dicts and
+    lists on the path to a changed datetime are copied, everything else is shared with root, so the
+    caller's data is never mutated. Data without (changed) datetimes comes back as root itself.
+    """
+    _datetime, _dict, _list = datetime.datetime, dict, list
+
+    def walk(node):
+        copied = None
+        items = node.items() if isinstance(node, _dict) else enumerate(node)
+        for k, v in items:
+            # Exact type checks first: documents are plain dicts/lists, strings and numbers the common leaves
+            t = type(v)
+            if t is _datetime:
+                new = conversion_func(v)
+            elif t is _dict or t is _list:
+                new = walk(v)
+            elif t is str or t is int or t is float:
+                continue
+            elif isinstance(v, _datetime):      # Subclasses, e.g. pandas.Timestamp
+                new = conversion_func(v)
+            elif isinstance(v, (_dict, _list)):
+                new = walk(v)
+            else:
+                continue
+            if new is not v:
+                if copied is None:
+                    copied = node.copy()
+                copied[k] = new
+        return node if copied is None else copied
+
+    if isinstance(root, _datetime):
+        return conversion_func(root)
+    if not isinstance(root, (_dict, _list)):
+        return root
+    return walk(root)
+
+
+def _postprocess_inplace(root: Dict, to_local: callable = _utc_to_local, convert_id: bool = True) -> Dict:
+    """
+    Output counterpart of _walk_dates for documents freshly decoded by PyMongo (caller-owned, so
+    mutating in place is safe): converts datetimes with to_local and, with convert_id, the
+    top-level ObjectId '_id' to its hex string, in a single pass. Decoded documents only hold
+    exact dict/list/datetime types, so dispatch is by type identity alone.
+    """
+    _datetime, _dict, _list, _oid = datetime.datetime, dict, list, ObjectId
+
+    stack = deque([root])
+    pop, push = stack.pop, stack.append
+    while stack:
+        node = pop()
+        if type(node) is _dict:
+            for k, v in node.items():
+                t = type(v)
+                if t is _datetime:
+                    node[k] = to_local(v)
+                elif t is _dict or t is _list:
+                    push(v)
+                elif t is _oid and convert_id and k == '_id' and node is root:
+                    node[k] = v.binary.hex()
+        else:
+            for i, v in enumerate(node):
+                t = type(v)
+                if t is _datetime:
+                    node[i] = to_local(v)
+                elif t is _dict or t is _list:
+                    push(v)
+    return root
+
+
+# Query operators whose clauses are full queries: string '_id' coercion applies inside them too
+_LOGICAL_QUERY_OPERATORS = ('$or', '$and', '$nor')
+
+
+def _coerce_query_ids(query: Any, strict: bool = True) -> Any:
+    """
+    Converts string '_id' values to ObjectId at the top level of a query and inside its
+    $or/$and/$nor clauses (recursively). Embedded documents are never touched.
+    A malformed '_id' raises InvalidId only where it makes the whole query unmatchable (top level
+    and $and); inside $or/$nor the clause is left as is, it just matches nothing on its own.
+    Returns a new dict when something changed, query itself otherwise.
+    """
+    if not isinstance(query, dict):
+        return query
+
+    coerced = None
+    if isinstance(query.get('_id'), str):
+        try:
+            oid = ObjectId(query['_id'])
+        except InvalidId:
+            if strict:
+                raise
+        else:
+            coerced = dict(query)
+            coerced['_id'] = oid
+
+    for op in _LOGICAL_QUERY_OPERATORS:
+        clauses = query.get(op)
+        if isinstance(clauses, list):
+            clause_strict = strict and op == '$and'
+            new_clauses = [_coerce_query_ids(clause, clause_strict) for clause in clauses]
+            if any(new is not old for new, old in zip(new_clauses, clauses)):
+                if coerced is None:
+                    coerced = dict(query)
+                coerced[op] = new_clauses
+    return query if coerced is None else coerced
+
+
+def _normalize_input(data: Any, coerce_ids: bool = False, needs_tz_walk: bool = True) -> Any:
+    """
+    Converts datetimes in query/write data to UTC, unless needs_tz_walk is False.
+    Queries pass coerce_ids=True to also convert string '_id' values to ObjectId, with the same
+    scope on both paths (see _coerce_query_ids). Raises InvalidId.
+    """
+    if coerce_ids:
+        data = _coerce_query_ids(data)
+    if needs_tz_walk:
+        return _walk_dates(data, _normalize_to_utc)
+    return data
+
+
+def _normalize_document(document: Dict[str, Any], needs_tz_walk: bool = True) -> Dict[str, Any]:
+    """
+    Normalizes a document for insertion. Always returns a new top-level dict: insert_one/insert_many
+    add the generated _id to the dict they are given, and that must not be the caller's.
+    """
+    processed = _normalize_input(document, needs_tz_walk=needs_tz_walk)
+    return dict(processed) if processed is document else processed
+
+
+def _prep_query(query: Dict[str, Any], needs_tz_walk: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Prepares a query/filter in one pass: string '_id' -> ObjectId and datetimes -> UTC.
+    Returns None if a malformed _id makes the query unmatchable; the caller should return its empty result.
+    """
+    try:
+        return _normalize_input(query, coerce_ids=True, needs_tz_walk=needs_tz_walk)
+    except InvalidId as e:
+        logger.warning(f"Invalid format for _id: {e}. Query cannot match any document.")
+        return None
+
+
+def _as_update_document(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Wraps a plain field mapping in $set; update documents using operators are returned as is."""
+    if not any(key.startswith('$') for key in update.keys()):
+        return {'$set': update}
+    return update
+
+
+def _stringify_id(document: Dict) -> Dict:
+    """Converts an ObjectId '_id' to its hex string. binary.hex() skips the str() -> hexlify().decode() detour."""
+    if '_id' in document and isinstance(document['_id'], ObjectId):
+        document['_id'] = document['_id'].binary.hex()
+    return document
+
+
+def _local_codec_options(codec_options: CodecOptions) -> CodecOptions:
+    """
+    Derives decoding options that yield tz-aware local datetimes straight from the C BSON decoder.
+    Everything else (uuidRepresentation, document_class, type_registry, ...) is kept from the client.
+    """
+    return codec_options.with_options(tz_aware=True, tzinfo=LOCAL_TZ)
+
+
+def _to_index_models(indexes: List[Union[IndexSpec, IndexModel]]) -> List[IndexModel]:
+    """
+    PyMongo > 4.0 requires a list of IndexModel objects. Key lists are wrapped, IndexModels pass
+    through so callers can declare options such as partialFilterExpression or unique.
+    """
+    return [index if isinstance(index, IndexModel) else IndexModel(index) for index in indexes]
+
+
+def _build_connection_uri(host: str, port: int, username: Optional[str],
+                          password: Optional[str], auth_source: str) -> str:
+    return f"mongodb://{username}:{password}@{host}:{port}/?authSource={auth_source}" \
+        if username and password else f"mongodb://{host}:{port}/"
+
+
 class MongoDBError(Exception):
     """Base exception for MongoDB operations"""
 
@@ -60,6 +366,7 @@ class MongoDBStorage:
 
     Key Features:
     - Centralized connection management following PyMongo best practices.
+      Handlers connecting to the same server with the same options share one MongoClient.
     - Automatic Timezone Conversion:
         - On Write (insert, update): All datetime objects in input data
           are automatically converted to timezone-aware UTC before storage.
@@ -68,6 +375,9 @@ class MongoDBStorage:
           are automatically converted from UTC to the local timezone.
     - Automatic ObjectId to String Conversion:
         - The '_id' field of returned documents is converted from ObjectId to string.
+    - Optional Query Result Cache:
+        - find_one / count_documents accept cache=True to serve repeated queries from
+          an in-process LRU+TTL cache. Any write through this instance invalidates it.
     """
 
     def __init__(self,
@@ -79,16 +389,88 @@ class MongoDBStorage:
                  password: Optional[str] = None,
                  auth_source: str = 'admin',
                  max_pool_size: int = 100,
-                 indexes: Optional[List[IndexSpec]] = None,
+                 indexes: Optional[List[Union[IndexSpec, IndexModel]]] = None,
+                 query_cache_size: int = 1024,
+                 query_cache_ttl: float = 60.0,
+                 contains_datetimes: Optional[bool] = None,
+                 datetime_fields: Optional[List[str]] = None,
+                 datetime_learning_threshold: Optional[int] = None,
                  **kwargs):
         """
         Initializes the MongoDB connection and the storage handler.
+
+        :param query_cache_size: Max entries of the opt-in query result cache (0 disables it).
+        :param query_cache_ttl: Seconds a cached query result stays valid.
+        :param contains_datetimes: False if the collection never stores datetimes, which skips the
+                                   timezone walk on every read and write. None (default) always walks.
+        :param datetime_fields: Exhaustive list of (dot notation) fields holding datetimes. When given,
+                                read results convert only these fields instead of walking the document.
+        :param datetime_learning_threshold: Opt-in, with contains_datetimes=None: the number of datetime-free
+                                            find_one results after which find_one stops walking documents.
+                                            Only suitable for collections with a uniform schema.
+                                            None (default) never learns.
         """
-        self.connection_uri = f"mongodb://{username}:{password}@{host}:{port}/?authSource={auth_source}" \
-            if username and password else f"mongodb://{host}:{port}/"
+        self.connection_uri = _build_connection_uri(host, port, username, password, auth_source)
+
+        self._max_pool_size = max_pool_size
+
+        # Handlers for different collections on the same server share one MongoClient (and pool)
+        self._client_key = (self.connection_uri, max_pool_size,
+                            tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+        self._closed = False
+        self.client = self._acquire_client(self._client_key, max_pool_size, **kwargs)
+
+        self.db: Database = self.client[db_name]
+        self.collection: Collection = self.db[collection_name]
+
+        # Cursor-read handle (iter_find): the C BSON decoder hands out local-time
+        # datetimes for the whole batch, so these documents skip the Python-level output walk.
+        self._local_codec_options = _local_codec_options(self.collection.codec_options)
+        self._local_collection: Collection = self.collection.with_options(codec_options=self._local_codec_options)
+
+        # Query result cache: key -> (expire_at, value). The collection's generation counter is part of
+        # the key so that results fetched before a write (through any handler of this process) are never
+        # served after it. Writes from other processes are only picked up when the TTL expires.
+        self._query_cache_size = max(0, query_cache_size)
+        self._query_cache_ttl = query_cache_ttl
+        self._query_cache: OrderedDict = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self._cache_generation_key = (self._client_key, db_name, collection_name)
+
+        # Timezone walk guards. Writes are never learned: skipping a walk there would store
+        # naive datetimes with the wrong offset, so only an explicit False disables it.
+        # Reads are only learned on request, and only from find_one documents (see process_document_output).
+        self._needs_tz_walk = contains_datetimes is not False
+        self._needs_output_walk = contains_datetimes is not False
+        self._learning_output_walk = contains_datetimes is None and datetime_learning_threshold is not None
+        self._datetime_free_outputs = 0
+        self._datetime_learning_threshold = max(1, datetime_learning_threshold or 1)
+
+        # Storage kind ('timestamp' / 'datetime') of export time fields, see _detect_time_field_kind
+        self._time_field_kind: Dict[str, str] = {}
+
+        # Pre-split datetime field paths for the specialized output conversion
+        self._datetime_paths: Optional[List[Tuple[Tuple[str, ...], str]]] = \
+            [(_split_path(field)[:-1], _split_path(field)[-1]) for field in datetime_fields] \
+            if datetime_fields else None
+
+        if indexes:
+            self._create_indexes(indexes)
+
+    def _acquire_client(self, key: tuple, max_pool_size: int, **kwargs) -> MongoClient:
+        """
+        Returns the process-wide client for key, creating and verifying it on first use.
+        The client is created and pinged outside the cache lock (the ping may take seconds);
+        if another handler registered one for the same key meanwhile, the new one is discarded.
+        """
+        with _CLIENT_CACHE_LOCK:
+            entry = _CLIENT_CACHE.get(key)
+            if entry is not None:
+                entry[1] += 1
+                return entry[0]
 
         try:
-            self.client = MongoClient(
+            client = MongoClient(
                 self.connection_uri,
                 maxPoolSize=max_pool_size,
                 connectTimeoutMS=3000,
@@ -97,24 +479,26 @@ class MongoDBStorage:
                 **kwargs
             )
             # Verify connection
-            self.client.admin.command('ping')
+            client.admin.command('ping')
             logger.info("MongoDB connection successful.")
         except PyMongoError as e:
             logger.critical(f"MongoDB connection failed: {e}")
             raise MongoDBConnectionError(f"Failed to connect to MongoDB: {e}") from e
 
-        self.db: Database = self.client[db_name]
-        self.collection: Collection = self.db[collection_name]
-
-        if indexes:
-            self._create_indexes(indexes)
-
-    def _create_indexes(self, indexes: List[IndexSpec]) -> None:
+        with _CLIENT_CACHE_LOCK:
+            entry = _CLIENT_CACHE.get(key)
+            if entry is None:
+                entry = _CLIENT_CACHE[key] = [client, 0]
+                client = None
+            entry[1] += 1
+        if client is not None:
+            client.close()  # Lost the race: another handler's client is shared instead
+        return entry[0]
+
+    def _create_indexes(self, indexes: List[Union[IndexSpec, IndexModel]]) -> None:
         """Create indexes on the collection."""
         try:
-            # PyMongo > 4.0 requires a list of IndexModel objects.
-            index_models = [IndexModel(index) for index in indexes]
-            self.collection.create_indexes(index_models)
+            self.collection.create_indexes(_to_index_models(indexes))
             logger.info(f"Indexes ensured for collection '{self.collection.name}'.")
         except PyMongoError as e:
             logger.error(f"Failed to create indexes: {e}")
@@ -122,33 +506,117 @@ class MongoDBStorage:
 
     # --- Helper Methods ---
 
-    def _normalize_to_utc(self, dt: datetime.datetime) -> datetime.datetime:
-        """Converts a datetime object to timezone-aware UTC."""
-        if dt.tzinfo is None:
-            # Assume naive datetime is in local timezone
-            return dt.replace(tzinfo=LOCAL_TZ).astimezone(UTC)
-        # If already aware, just convert to UTC
-        return dt.astimezone(UTC)
-
-    def _process_dates_recursive(self, data: Any, conversion_func: callable) -> Any:
-        """Recursively traverses data to apply a conversion function to datetime objects."""
-        if isinstance(data, dict):
-            return {k: self._process_dates_recursive(v, conversion_func) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [self._process_dates_recursive(item, conversion_func) for item in data]
-        elif isinstance(data, datetime.datetime):
-            return conversion_func(data)
-        return data
-
-    def process_document_output(self, document: Optional[Dict]) -> Optional[Dict]:
-        """Handles common processing for documents coming from the database."""
+    def _cache_key(self, op: str, query: Dict[str, Any], kwargs: Dict[str, Any]) -> Optional[tuple]:
+        """Builds a canonical cache key from the processed query. Returns None if not cacheable."""
+        if self._query_cache_size <= 0:
+            return None
+        try:
+            generation = _CACHE_GENERATIONS.get(self._cache_generation_key, 0)
+            return op, generation, bson_encode(query), repr(sorted(kwargs.items()))
+        except Exception:
+            return None
+
+    def _cache_get(self, key: Optional[tuple]) -> Any:
+        """Returns a copy of the cached value, or _CACHE_MISS if absent or expired."""
+        if key is None:
+            return _CACHE_MISS
+        with self._query_cache_lock:
+            entry = self._query_cache.get(key)
+            if entry is None:
+                return _CACHE_MISS
+            expire_at, value = entry
+            if expire_at < time.monotonic() or key[1] != _CACHE_GENERATIONS.get(self._cache_generation_key, 0):
+                del self._query_cache[key]
+                return _CACHE_MISS
+            self._query_cache.move_to_end(key)
+        # Callers may mutate returned documents, never hand out the cached object itself.
+        return copy.deepcopy(value)
+
+    def _cache_set(self, key: Optional[tuple], value: Any) -> None:
+        if key is None:
+            return
+        with self._query_cache_lock:
+            if key[1] != _CACHE_GENERATIONS.get(self._cache_generation_key, 0):
+                return  # A write happened while this query was in flight
+            self._query_cache[key] = (time.monotonic() + self._query_cache_ttl, copy.deepcopy(value))
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+
+    def _invalidate_query_cache(self) -> None:
+        """
+        Drops all cached query results. Called after every write operation.
+        Bumping the shared generation also invalidates the caches of other handlers of the collection.
+        """
+        with _CACHE_GENERATIONS_LOCK:
+            _CACHE_GENERATIONS[self._cache_generation_key] = _CACHE_GENERATIONS.get(self._cache_generation_key, 0) + 1
+        with self._query_cache_lock:
+            self._query_cache.clear()
+
+    def _normalize_input(self, data: Any, coerce_ids: bool = False) -> Any:
+        """Module-level _normalize_input, skipping the walk if the collection has no datetimes."""
+        return _normalize_input(data, coerce_ids, self._needs_tz_walk)
+
+    def _prep_query(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Module-level _prep_query, skipping the datetime walk if the collection has no datetimes."""
+        return _prep_query(query, self._needs_tz_walk)
+
+    def _learn_output_walk(self, found_datetime: bool) -> None:
+        """Disables the output walk once enough documents came back without any datetime."""
+        if found_datetime:
+            self._learning_output_walk = False
+            return
+        self._datetime_free_outputs += 1
+        if self._datetime_free_outputs >= self._datetime_learning_threshold:
+            self._learning_output_walk = False
+            self._needs_output_walk = False
+            logger.info(f"No datetimes in collection '{self.collection.name}' output, skipping timezone walk.")
+
+    def _convert_datetime_fields(self, document: Dict) -> Dict:
+        """Converts only the declared datetime fields to local time. Missing fields are ignored."""
+        for parent_keys, key in self._datetime_paths:
+            parent = document
+            for parent_key in parent_keys:
+                parent = parent.get(parent_key) if type(parent) is dict else None
+            if type(parent) is dict:
+                value = parent.get(key)
+                if isinstance(value, datetime.datetime):
+                    parent[key] = _utc_to_local(value)
+        return document
+
+    def process_document_output(self,
+                                document: Optional[Dict],
+                                convert_id: bool = True,
+                                learn: bool = False) -> Optional[Dict]:
+        """
+        Handles common processing for documents coming from the database, mutating them in place.
+        convert_id=False leaves the ObjectId _id to the caller (e.g. a JSON encoder).
+        learn=True lets a stored document count toward the opt-in datetime learning; only pass it
+        for whole stored documents, never for projections or aggregation output.
+        """
         if not document:
             return None
-        # Convert _id if it's an ObjectId
-        if '_id' in document and isinstance(document['_id'], ObjectId):
-            document['_id'] = str(document['_id'])
-        # Convert all UTC datetimes to local time
-        return self._process_dates_recursive(document, lambda dt: dt.astimezone(LOCAL_TZ))
+        if self._datetime_paths is not None:
+            if convert_id:
+                _stringify_id(document)
+            return self._convert_datetime_fields(document)
+        if not self._needs_output_walk:
+            return _stringify_id(document) if convert_id else document
+
+        if learn and self._learning_output_walk:
+            found_datetime = False
+
+            def to_local(dt: datetime.datetime) -> datetime.datetime:
+                nonlocal found_datetime
+                found_datetime = True
+                return _utc_to_local(dt)
+
+            document = _postprocess_inplace(document, to_local, convert_id)
+            self._learn_output_walk(found_datetime)
+            return document
+
+        # Convert all UTC datetimes to local time and the _id to string in one pass
+        return _postprocess_inplace(document, _utc_to_local, convert_id)
 
     # --- CRUD Methods ---
 
@@ -158,45 +626,65 @@ class MongoDBStorage:
         Returns the string representation of the inserted document's _id.
         """
         try:
-            processed_data = self._process_dates_recursive(data, self._normalize_to_utc)
+            processed_data = _normalize_document(data, self._needs_tz_walk)
             result = self.collection.insert_one(processed_data, **kwargs)
             return str(result.inserted_id)
         except PyMongoError as e:
             logger.error(f"Insert operation failed: {e}")
             raise MongoDBOperationError from e
-
-    def bulk_insert(self, data_list: List[Dict[str, Any]], **kwargs) -> List[str]:
+        finally:
+            # Also after a failure: the write may have been applied before the error was reported
+            self._invalidate_query_cache()
+
+    def bulk_insert(self,
+                    data_list: Iterable[Dict[str, Any]],
+                    bypass_document_validation: bool = False,
+                    **kwargs) -> List[str]:
         """
         Inserts multiple documents, converting datetimes in each to UTC.
+        Accepts any iterable (e.g. a generator). Documents are normalized lazily and sent in
+        unordered insert_many chunks of BULK_INSERT_CHUNK_SIZE, so memory stays bounded by one chunk.
         Returns a list of string representations of the inserted _ids.
         """
-        if not data_list:
-            return []
+        inserted_ids = []
+        documents = (_normalize_document(doc, self._needs_tz_walk) for doc in data_list)
         try:
-            processed_list = [self._process_dates_recursive(doc, self._normalize_to_utc) for doc in data_list]
-            result = self.collection.insert_many(processed_list, ordered=False, **kwargs)
-            return [str(id) for id in result.inserted_ids]
+            while True:
+                chunk = list(itertools.islice(documents, BULK_INSERT_CHUNK_SIZE))
+                if not chunk:
+                    break
+                result = self.collection.insert_many(
+                    chunk, ordered=False, bypass_document_validation=bypass_document_validation, **kwargs)
+                inserted_ids.extend(str(id) for id in result.inserted_ids)
+            return inserted_ids
         except PyMongoError as e:
             logger.error(f"Bulk insert operation failed: {e}")
             raise MongoDBOperationError from e
+        finally:
+            # Also after a failed chunk: unordered inserts may have written part of it
+            self._invalidate_query_cache()
 
-    def find_one(self, query_dict: Dict[str, Any], **kwargs) -> Optional[Dict]:
+    def find_one(self, query_dict: Dict[str, Any], cache: bool = False, **kwargs) -> Optional[Dict]:
         """
         Finds a single document. Converts datetimes in the query to UTC for searching,
         and converts datetimes and _id in the result.
+        If cache is True, the result is served from / stored into the query result cache.
         """
         try:
-            # Convert top-level string _id to ObjectId for querying
-            if '_id' in query_dict and isinstance(query_dict['_id'], str):
-                try:
-                    query_dict['_id'] = ObjectId(query_dict['_id'])
-                except Exception:  # Catches bson.errors.InvalidId
-                    logger.warning(f"Invalid format for _id: '{query_dict['_id']}'. Cannot be converted to ObjectId.")
-                    return None  # No document can match an invalid ID format
-
-            processed_query = self._process_dates_recursive(query_dict, self._normalize_to_utc)
-            document = self.collection.find_one(processed_query, **kwargs)
-            return self.process_document_output(document)
+            processed_query = self._prep_query(query_dict)
+            if processed_query is None:
+                return None  # No document can match an invalid ID format
+
+            cache_key = self._cache_key('find_one', processed_query, kwargs) if cache else None
+            cached = self._cache_get(cache_key)
+            if cached is not _CACHE_MISS:
+                return cached
+
+            # Projected results may omit datetime fields, they must not count toward learning
+            document = self.process_document_output(self.collection.find_one(processed_query, **kwargs),
+                                                    learn='projection' not in kwargs)
+            self._cache_set(cache_key, document)
+            return document
         except PyMongoError as e:
             logger.error(f"Find_one operation failed: {e}")
             raise MongoDBOperationError from e
@@ -210,73 +698,117 @@ class MongoDBStorage:
         Finds multiple documents with sorting and limit options.
         Handles timezone and _id conversions for query and results.
         """
-        try:
-            # Convert top-level string _id to ObjectId for querying
-            if '_id' in query_dict and isinstance(query_dict['_id'], str):
-                try:
-                    query_dict['_id'] = ObjectId(query_dict['_id'])
-                except Exception:
-                    logger.warning(f"Invalid format for _id: '{query_dict['_id']}'. Query will return no results.")
-                    return []  # No document can match an invalid ID format
+        return list(self.iter_find(query_dict, sort, limit, **kwargs))
 
-            processed_query = self._process_dates_recursive(query_dict, self._normalize_to_utc)
-            cursor = self.collection.find(processed_query, **kwargs)
+    def iter_find(self,
+                  query_dict: Dict[str, Any],
+                  sort: Optional[IndexSpec] = None,
+                  limit: int = 0,
+                  batch_size: int = 1000,
+                  **kwargs) -> Iterator[Dict]:
+        """
+        Lazy variant of find_many: yields processed documents while the cursor streams,
+        so callers overlap their work with server batches and never hold the full result.
+        batch_size sets the server batch size (fewer getMore round trips than the default).
+        Datetimes are converted to local time by the BSON decoder, only _id is left to convert here.
+        """
+        processed_query = self._prep_query(query_dict)
+        if processed_query is None:
+            return  # No document can match an invalid ID format
+
+        cursor = None
+        try:
+            cursor = self._local_collection.find(processed_query, batch_size=batch_size, **kwargs)
 
             if sort:
                 cursor = cursor.sort(sort)
             if limit > 0:
                 cursor = cursor.limit(limit)
 
-            return [self.process_document_output(doc) for doc in cursor]
+            for doc in cursor:
+                yield _stringify_id(doc)
         except PyMongoError as e:
             logger.error(f"Find_many operation failed: {e}")
             raise MongoDBOperationError from e
+        finally:
+            if cursor is not None:
+                cursor.close()
 
     def update(self, filter_query: Dict[str, Any], update_data: Dict[str, Any], **kwargs) -> Tuple[int, int]:
         """
         Updates documents matching the filter. Handles timezone conversion for
         both the filter and the update data.
         """
+        processed_filter = self._prep_query(filter_query)
+        if processed_filter is None:
+            return 0, 0
+        processed_update = _as_update_document(self._normalize_input(update_data))
+
         try:
-            # Convert top-level string _id to ObjectId for querying
-            if '_id' in filter_query and isinstance(filter_query['_id'], str):
-                try:
-                    filter_query['_id'] = ObjectId(filter_query['_id'])
-                except Exception:
-                    logger.warning(
-                        f"Invalid format for _id in filter: '{filter_query['_id']}'. Update will match 0 documents.")
-                    return 0, 0
+            result = self.collection.update_many(processed_filter, processed_update, **kwargs)
+            return result.matched_count, result.modified_count
+        except PyMongoError as e:
+            logger.error(f"Update operation failed: {e}")
+            raise MongoDBOperationError from e
+        finally:
+            # Also after a failure: update_many may have modified part of the matched documents
+            self._invalidate_query_cache()
+
+    def bulk_update(self,
+                    operations: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                    bypass_document_validation: bool = False,
+                    **kwargs) -> Tuple[int, int]:
+        """
+        Applies multiple (filter, update) pairs in a single unordered bulk_write round trip.
+        Each pair gets the same _id and timezone handling as update().
+        Pairs whose filter has an invalid string _id are skipped, as they cannot match.
+        Returns the summed (matched_count, modified_count).
+        """
+        requests = []
+        for filter_query, update_data in operations:
+            processed_filter = self._prep_query(filter_query)
+            if processed_filter is None:
+                continue  # Cannot match anything, skip the operation
 
-            processed_filter = self._process_dates_recursive(filter_query, self._normalize_to_utc)
-            processed_update = self._process_dates_recursive(update_data, self._normalize_to_utc)
+            processed_update = _as_update_document(self._normalize_input(update_data))
 
-            if not any(key.startswith('$') for key in processed_update.keys()):
-                processed_update = {'$set': processed_update}
+            requests.append(UpdateMany(processed_filter, processed_update))
 
-            result = self.collection.update_many(processed_filter, processed_update, **kwargs)
+        if not requests:
+            return 0, 0
+
+        try:
+            result = self.collection.bulk_write(
+                requests, ordered=False, bypass_document_validation=bypass_document_validation, **kwargs)
             return result.matched_count, result.modified_count
         except PyMongoError as e:
-            logger.error(f"Update operation failed: {e}")
+            logger.error(f"Bulk update operation failed: {e}")
             raise MongoDBOperationError from e
+        finally:
+            # Also after a failure: an unordered bulk_write applies the operations that succeeded
+            self._invalidate_query_cache()
 
     # --- Advanced Query Methods ---
 
-    def count_documents(self, query_dict: Dict[str, Any], **kwargs) -> int:
+    def count_documents(self, query_dict: Dict[str, Any], cache: bool = False, **kwargs) -> int:
         """
         Counts documents matching the query.
         Handles timezone conversion for any datetimes in the query.
+        If cache is True, the result is served from / stored into the query result cache.
         """
         try:
-            # Convert top-level string _id to ObjectId for querying
-            if '_id' in query_dict and isinstance(query_dict['_id'], str):
-                try:
-                    query_dict['_id'] = ObjectId(query_dict['_id'])
-                except Exception:
-                    logger.warning(f"Invalid format for _id: '{query_dict['_id']}'. Count will be 0.")
-                    return 0
+            processed_query = self._prep_query(query_dict)
+            if processed_query is None:
+                return 0
 
-            processed_query = self._process_dates_recursive(query_dict, self._normalize_to_utc)
-            return self.collection.count_documents(processed_query, **kwargs)
+            cache_key = self._cache_key('count_documents', processed_query, kwargs) if cache else None
+            cached = self._cache_get(cache_key)
+            if cached is not _CACHE_MISS:
+                return cached
+
+            count = self.collection.count_documents(processed_query, **kwargs)
+            self._cache_set(cache_key, count)
+            return count
         except PyMongoError as e:
             logger.error(f"Count_documents operation failed: {e}")
             raise MongoDBOperationError from e
@@ -290,38 +822,72 @@ class MongoDBStorage:
         complex pipelines; provide ObjectIds directly in stages like $match.
         """
         try:
-            processed_pipeline = self._process_dates_recursive(pipeline, self._normalize_to_utc)
+            processed_pipeline = self._normalize_input(pipeline)
             cursor = self.collection.aggregate(processed_pipeline, **kwargs)
-            return [self.process_document_output(doc) for doc in cursor]
+            # Aggregation rows don't have the stored documents' shape: datetime_fields and the learned
+            # walk state describe stored documents only, so rows always get the full walk.
+            if not self._needs_tz_walk:
+                return [_stringify_id(doc) for doc in cursor]
+            return [_postprocess_inplace(doc) for doc in cursor]
         except PyMongoError as e:
             logger.error(f"Aggregation operation failed: {e}")
             raise MongoDBOperationError from e
 
     def close(self) -> None:
-        """Closes the client connection."""
+        """
+        Releases this handler's reference to the shared client.
+        The connection is closed when the last handler using it is closed.
+        """
+        with _CLIENT_CACHE_LOCK:
+            if self._closed:
+                return
+            self._closed = True
+            entry = _CLIENT_CACHE.get(self._client_key)
+            if entry is None or entry[0] is not self.client:
+                return  # Already closed by close_all()
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del _CLIENT_CACHE[self._client_key]
         self.client.close()
         logger.info("MongoDB connection closed.")
 
+    @classmethod
+    def close_all(cls) -> None:
+        """Closes every shared client regardless of remaining handlers. Intended for process shutdown."""
+        with _CLIENT_CACHE_LOCK:
+            clients = [client for client, _ in _CLIENT_CACHE.values()]
+            _CLIENT_CACHE.clear()
+        for client in clients:
+            client.close()
+        logger.info(f"Closed {len(clients)} shared MongoDB connection(s).")
+
     # ------------------------------------------ Export ------------------------------------------
 
     def _generate_filename(self,
                            prefix: str,
                            time_str: str,
                            directory: str,
-                           add_timestamp: bool = False) -> str:
+                           add_timestamp: bool = False,
+                           batch_ts: Optional[str] = None) -> str:
         """
         Generates a standardized filename.
         Format: {directory}/{prefix}_{time_str}[_timestamp].json
+        batch_ts lets a multi-file export stamp all its files with the same timestamp.
         """
         filename = f"{prefix}_{time_str}"
 
         if add_timestamp:
             # Use compact timestamp format, e.g., 20231129103005
-            ts = datetime.datetime.now(LOCAL_TZ).strftime("%Y%m%d%H%M%S")
+            ts = batch_ts or self._export_timestamp()
             filename += f"_{ts}"
 
         return str(Path(directory) / f"{filename}.json")
 
+    @staticmethod
+    def _export_timestamp() -> str:
+        return datetime.datetime.now(LOCAL_TZ).strftime("%Y%m%d%H%M%S")
+
     def _get_nested_value(self, doc: Dict[str, Any], path: str) -> Any:
         """
         Helper to retrieve value from nested dict using dot notation (e.g., 'meta.created_at').
@@ -330,76 +896,62 @@ class MongoDBStorage:
         if not doc:
             return None
 
-        keys = path.split('.')
         value = doc
-        for key in keys:
-            if isinstance(value, dict):
-                value = value.get(key)
-            else:
+        for key in _split_path(path):
+            if type(value) is not dict:
                 return None
+            value = value.get(key)
         return value
 
-    def _stream_cursor_to_json(self, cursor, filepath: str, batch_size: int = 2000) -> int:
+    def _stream_cursor_to_json(self, raw_cursor, filepath: str) -> int:
         """
-        Streams MongoDB cursor data to a JSON file incrementally in batches.
-        Uses Atomic Write pattern (.tmp -> rename) to prevent incomplete files.
+        Streams a find_raw_batches() cursor to a JSON file, one server batch at a time:
+        each raw BSON batch is decoded in C with the local codec options (local-time datetimes)
+        and serialized in a single encoder call, so no per-document Python work is done.
+        Uses Atomic Write pattern (.tmp -> os.replace) to prevent incomplete files.
+        Returns 0 without creating any file if the cursor is empty.
         """
         count = 0
-        # 1. 定义临时文件路径
-        temp_filepath = f"{filepath}.tmp"
+        # 1. 定义临时文件路径 (per process and per call: concurrent exports of the same file never share a temp file)
+        temp_filepath = f"{filepath}.{os.getpid()}.{next(_EXPORT_TMP_COUNTER)}.tmp"
         path_obj = Path(filepath)
 
         try:
-            # 确保目录存在
-            if not path_obj.parent.exists():
-                path_obj.parent.mkdir(parents=True, exist_ok=True)
-
-            # 2. 写入临时文件
-            with open(temp_filepath, 'w', encoding='utf-8') as f:
-                f.write('[')
-
-                batch = []
-                first_batch = True
-
-                # 使用 try...finally 确保游标在异常时也能立即关闭
-                try:
-                    for document in cursor:
-                        processed_doc = self.process_document_output(document)
-                        batch.append(processed_doc)
-
-                        if len(batch) >= batch_size:
-                            json_strings = [json.dumps(doc, cls=DateTimeEncoder, ensure_ascii=False) for doc in batch]
-                            chunk = ',\n'.join(json_strings)
-
-                            if not first_batch:
-                                f.write(',\n')
-                            f.write(chunk)
-
-                            count += len(batch)
-                            batch = []
-                            first_batch = False
+            # 使用 try...finally 确保游标在异常时也能立即关闭
+            try:
+                batches = (documents for documents in
+                           (decode_all(raw_batch, self._local_codec_options) for raw_batch in raw_cursor)
+                           if documents)
+
+                # Peek the first batch: an empty result must not produce a file
+                first_batch = next(batches, None)
+                if first_batch is None:
+                    return 0
 
-                    # 写入剩余批次
-                    if batch:
-                        json_strings = [json.dumps(doc, cls=DateTimeEncoder, ensure_ascii=False) for doc in batch]
-                        chunk = ',\n'.join(json_strings)
+                # 确保目录存在
+                if not path_obj.parent.exists():
+                    path_obj.parent.mkdir(parents=True, exist_ok=True)
 
-                        if not first_batch:
-                            f.write(',\n')
-                        f.write(chunk)
-                        count += len(batch)
+                # 2. 写入临时文件
+                # 1 MiB buffer: keep the syscall count low on multi-GB exports
+                with open(temp_filepath, 'wb', buffering=EXPORT_WRITE_BUFFER_SIZE) as f:
+                    f.write(b'[')
+                    f.write(_dumps_json_items(first_batch))
+                    count = len(first_batch)
 
-                finally:
-                    # [关键优化] 显式关闭游标，立即释放数据库资源，而不是等待 GC
-                    if cursor:
-                        cursor.close()
+                    # Datetimes are already local, _id stays ObjectId and is stringified by the JSON encoder
+                    for documents in batches:
+                        f.write(b',\n')
+                        f.write(_dumps_json_items(documents))
+                        count += len(documents)
 
-                f.write(']')
+                    f.write(b']')
+            finally:
+                # [关键优化] 显式关闭游标，立即释放数据库资源，而不是等待 GC
+                raw_cursor.close()
 
-            # 3. 写入成功：原子重命名 (Windows下需要先删除目标文件，Linux可直接覆盖)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            os.rename(temp_filepath, filepath)
+            # 3. 写入成功：原子替换 (os.replace overwrites the target on both Windows and Linux)
+            os.replace(temp_filepath, filepath)
 
             logger.info(f"Successfully streamed {count} records to {filepath}")
             return count
@@ -418,6 +970,28 @@ class MongoDBStorage:
             # 向上抛出异常，让调用者知道任务失败了
             raise
 
+    def _detect_time_field_kind(self, time_field: str) -> Optional[str]:
+        """
+        Returns 'timestamp' if time_field is stored as a number, 'datetime' otherwise,
+        or None if no document has the field yet. Memoized per field for the instance lifetime,
+        so export_all does not re-probe the collection for every month/week.
+        """
+        kind = self._time_field_kind.get(time_field)
+        if kind is not None:
+            return kind
+
+        # 探测数据库中该字段的存储格式 (Peek one document)
+        # 因为不能加参数传递格式信息，所以此处查询一次样本数据来判断
+        sample_doc = self.collection.find_one({time_field: {"$exists": True}}, {time_field: 1})
+        if not sample_doc:
+            return None     # Nothing to learn from yet, probe again next time
+
+        val = self._get_nested_value(sample_doc, time_field)
+        # 如果数据库存的是数字(int/float)，说明是时间戳格式
+        kind = 'timestamp' if isinstance(val, (int, float)) else 'datetime'
+        self._time_field_kind[time_field] = kind
+        return kind
+
     def export_by_time_range(self,
                              start_dt: datetime.datetime,
                              end_dt: datetime.datetime,
@@ -425,9 +999,12 @@ class MongoDBStorage:
                              time_field: str = "created_at",
                              file_prefix: str = "export",
                              add_timestamp: bool = False,
-                             filename_override: Optional[str] = None) -> str:
+                             filename_override: Optional[str] = None,
+                             batch_ts: Optional[str] = None,
+                             projection: Optional[Dict[str, Any]] = None) -> str:
         """
         Core export function: Exports data within a specific time range using Streaming.
+        projection limits the exported fields, e.g. {'RAW_DATA': 0} to leave out large fields.
         """
         # 1. Normalize Timezones (Input -> UTC)
         if start_dt.tzinfo is None:
@@ -435,23 +1012,18 @@ class MongoDBStorage:
         if end_dt.tzinfo is None:
             end_dt = end_dt.replace(tzinfo=LOCAL_TZ)
 
-        # Convert to UTC for the database query
-        start_utc = self._normalize_to_utc(start_dt)
-        end_utc = self._normalize_to_utc(end_dt)
+        # Convert to UTC for the database query. Both ends are aware here, convert directly.
+        # The query is sent as built: it does not go through the input walk.
+        start_utc = start_dt.astimezone(UTC)
+        end_utc = end_dt.astimezone(UTC)
 
         # --- 修改部分开始：自动检测是否需要转换为时间戳 ---
         query_start = start_utc
         query_end = end_utc
 
-        # 探测数据库中该字段的存储格式 (Peek one document)
-        # 因为不能加参数传递格式信息，所以此处查询一次样本数据来判断
-        sample_doc = self.collection.find_one({time_field: {"$exists": True}}, {time_field: 1})
-        if sample_doc:
-            val = self._get_nested_value(sample_doc, time_field)
-            # 如果数据库存的是数字(int/float)，说明是时间戳格式
-            if isinstance(val, (int, float)):
-                query_start = start_utc.timestamp()
-                query_end = end_utc.timestamp()
+        if self._detect_time_field_kind(time_field) == 'timestamp':
+            query_start = start_utc.timestamp()
+            query_end = end_utc.timestamp()
         # --- 修改部分结束 ---
 
         # 2. Build Query
@@ -463,11 +1035,9 @@ class MongoDBStorage:
         }
 
         # 3. Get Cursor (Lazy evaluation)
-        cursor = self.collection.find(query)
-
-        if self.collection.count_documents(query) == 0:
-            logger.warning(f"No data found between {start_dt} and {end_dt}.")
-            return ""
+        # Large server batches: fewer getMore round trips, throughput bound by bandwidth instead of RTT
+        # Raw batches: BSON is only decoded in _stream_cursor_to_json, one whole batch per call
+        raw_cursor = self.collection.find_raw_batches(query, projection, batch_size=EXPORT_CURSOR_BATCH_SIZE)
 
         # 4. Generate Filename
         if filename_override:
@@ -478,10 +1048,12 @@ class MongoDBStorage:
                 fmt = "%Y%m%d%H%M"
             time_str = f"{start_dt.strftime(fmt)}_{end_dt.strftime(fmt)}"
 
-        filepath = self._generate_filename(file_prefix, time_str, directory, add_timestamp)
+        filepath = self._generate_filename(file_prefix, time_str, directory, add_timestamp, batch_ts)
 
-        # 5. Execute Stream Export
-        self._stream_cursor_to_json(cursor, filepath)
+        # 5. Execute Stream Export. Emptiness is detected from the cursor itself, no count_documents pre-flight.
+        if self._stream_cursor_to_json(raw_cursor, filepath) == 0:
+            logger.warning(f"No data found between {start_dt} and {end_dt}.")
+            return ""
 
         return filepath
 
@@ -490,7 +1062,8 @@ class MongoDBStorage:
                         month: int,
                         directory: str,
                         time_field: str = "created_at",
-                        add_timestamp: bool = False) -> str:
+                        add_timestamp: bool = False,
+                        batch_ts: Optional[str] = None) -> str:
         """
         Exports data for a specific month (Streaming).
         """
@@ -504,7 +1077,8 @@ class MongoDBStorage:
             fname_str = f"{year}_{month:02d}"
 
             return self.export_by_time_range(
-                start_dt, end_dt, directory, time_field, "monthly", add_timestamp, filename_override=fname_str
+                start_dt, end_dt, directory, time_field, "monthly", add_timestamp,
+                filename_override=fname_str, batch_ts=batch_ts
             )
         except ValueError as e:
             logger.error(f"Invalid year or month: {e}")
@@ -515,7 +1089,8 @@ class MongoDBStorage:
                        week: int,
                        directory: str,
                        time_field: str = "created_at",
-                       add_timestamp: bool = False) -> str:
+                       add_timestamp: bool = False,
+                       batch_ts: Optional[str] = None) -> str:
         """
         Exports data for a specific ISO week (Streaming).
         """
@@ -526,12 +1101,50 @@ class MongoDBStorage:
             fname_str = f"{year}_W{week:02d}"
 
             return self.export_by_time_range(
-                start_dt, end_dt, directory, time_field, "weekly", add_timestamp, filename_override=fname_str
+                start_dt, end_dt, directory, time_field, "weekly", add_timestamp,
+                filename_override=fname_str, batch_ts=batch_ts
             )
         except ValueError as e:
             logger.error(f"Invalid year or week: {e}")
             return ""
 
+    def export_by_year(self,
+                       year: int,
+                       directory: str,
+                       time_field: str = "created_at",
+                       add_timestamp: bool = False,
+                       batch_ts: Optional[str] = None) -> str:
+        """
+        Exports data for a specific year (Streaming).
+        """
+        try:
+            start_dt = datetime.datetime(year, 1, 1, tzinfo=LOCAL_TZ)
+            end_dt = datetime.datetime(year + 1, 1, 1, tzinfo=LOCAL_TZ)
+
+            return self.export_by_time_range(
+                start_dt, end_dt, directory, time_field, "yearly", add_timestamp,
+                filename_override=f"{year}", batch_ts=batch_ts
+            )
+        except ValueError as e:
+            logger.error(f"Invalid year: {e}")
+            return ""
+
+    def _export_in_parallel(self, export_func, periods: List[tuple], *args) -> List[str]:
+        """
+        Runs export_func(*period, *args) for every period on a thread pool.
+        MongoClient is thread-safe and every period writes its own file, so exports
+        only share the connection pool. Returned paths keep the order of periods.
+        """
+        if not periods:
+            return []
+
+        max_workers = max(1, min(12, self._max_pool_size // 2, len(periods)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='MongoExport') as executor:
+            futures = [executor.submit(export_func, *period, *args) for period in periods]
+            paths = [future.result() for future in futures]
+
+        return [path for path in paths if path]
+
     def export_all(self,
                    directory: str,
                    split_by: Optional[str] = None,
@@ -539,27 +1152,32 @@ class MongoDBStorage:
                    add_timestamp: bool = False) -> List[str]:
         """
         Exports all data (Streaming).
+        All files of one call share the same timestamp suffix.
         """
+        batch_ts = self._export_timestamp() if add_timestamp else None
+
         if not split_by:
             start_dt = datetime.datetime(1970, 1, 1, tzinfo=LOCAL_TZ)
             end_dt = datetime.datetime.now(LOCAL_TZ) + datetime.timedelta(days=1)
             path = self.export_by_time_range(
-                start_dt, end_dt, directory, time_field, "all_data", add_timestamp, filename_override="full_dump"
+                start_dt, end_dt, directory, time_field, "all_data", add_timestamp,
+                filename_override="full_dump", batch_ts=batch_ts
             )
             return [path] if path else []
 
-        # Find range for iteration
-        min_doc = self.find_one({}, sort=[(time_field, ASCENDING)])
-        max_doc = self.find_one({}, sort=[(time_field, DESCENDING)])
+        # Find range for iteration: one $group round trip instead of two sort+limit queries.
+        # Dot notation works for nested fields (e.g. "APPENDIX.time_archived").
+        # Period iteration must run in local time; the bounds are converted explicitly below
+        bounds = self.aggregate([
+            {"$group": {"_id": None, "min": {"$min": f"${time_field}"}, "max": {"$max": f"${time_field}"}}}
+        ])
 
-        if not min_doc or not max_doc:
+        if not bounds or bounds[0].get('min') is None or bounds[0].get('max') is None:
             logger.warning("No data available to export.")
             return []
 
-        # Note: process_document_output converts output to Local, which is what we want for iteration logic
-        # FIX: Use helper to access nested fields via dot notation (e.g. "APPENDIX.time_archived")
-        raw_min = self._get_nested_value(min_doc, time_field)
-        raw_max = self._get_nested_value(max_doc, time_field)
+        raw_min = bounds[0]['min']
+        raw_max = bounds[0]['max']
 
         # 定义局部辅助函数：如果是时间戳(int/float)，则转换为带时区的 datetime
         def to_datetime(val: Any) -> Optional[datetime.datetime]:
@@ -569,6 +1187,8 @@ class MongoDBStorage:
                     return datetime.datetime.fromtimestamp(val, LOCAL_TZ)
                 except (ValueError, OSError):
                     return None
+            if isinstance(val, datetime.datetime):
+                return _utc_to_local(val)
             return val
 
         min_date: datetime.datetime = to_datetime(raw_min)
@@ -582,37 +1202,269 @@ class MongoDBStorage:
         current_date = min_date
 
         if split_by == 'month':
+            periods = []
             current_date = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             while current_date <= max_date:
-                path = self.export_by_month(current_date.year, current_date.month, directory, time_field, add_timestamp)
-                if path: generated_files.append(path)
+                periods.append((current_date.year, current_date.month))
 
                 year = current_date.year + (current_date.month // 12)
                 month = (current_date.month % 12) + 1
                 current_date = current_date.replace(year=year, month=month)
 
+            generated_files = self._export_in_parallel(
+                self.export_by_month, periods, directory, time_field, add_timestamp, batch_ts)
+
         elif split_by == 'week':
+            periods = []
             iso_year, iso_week, _ = current_date.isocalendar()
             current_date = datetime.datetime.strptime(f"{iso_year}-W{iso_week}-1", "%G-W%V-%u").replace(tzinfo=LOCAL_TZ)
             while current_date <= max_date:
                 y, w, _ = current_date.isocalendar()
-                path = self.export_by_week(y, w, directory, time_field, add_timestamp)
-                if path: generated_files.append(path)
+                periods.append((y, w))
                 current_date += datetime.timedelta(weeks=1)
 
+            generated_files = self._export_in_parallel(
+                self.export_by_week, periods, directory, time_field, add_timestamp, batch_ts)
+
         elif split_by == 'year':
-            current_date = current_date.replace(month=1, day=1, hour=0, minute=0, second=0)
-            while current_date <= max_date:
-                next_year = current_date.replace(year=current_date.year + 1)
-                fname = f"{current_date.year}"
-                path = self.export_by_time_range(
-                    current_date, next_year, directory, time_field, "yearly", add_timestamp, filename_override=fname
-                )
-                if path: generated_files.append(path)
-                current_date = next_year
+            periods = [(year,) for year in range(min_date.year, max_date.year + 1)]
+            generated_files = self._export_in_parallel(
+                self.export_by_year, periods, directory, time_field, add_timestamp, batch_ts)
 
         return generated_files
 
+
+class AsyncMongoDBStorage:
+    """
+    asyncio counterpart of MongoDBStorage, built on pymongo's native AsyncMongoClient.
+    Concurrent calls overlap their round trips instead of serializing on a thread, e.g.
+    await asyncio.gather(*[storage.find_one(q) for q in queries]).
+
+    Same conventions as MongoDBStorage: datetimes in input data are stored as UTC (naive ones
+    are assumed local), results come back with local-time datetimes and string '_id's.
+    Results are decoded to local-time datetimes by the BSON codec, so no Python-level output walk is needed.
+    The query result cache and the export helpers are only available on MongoDBStorage.
+
+    The driver connects lazily: await connect() (or use 'async with') to verify the
+    connection and create indexes up front.
+    """
+
+    def __init__(self,
+                 host: str = 'localhost',
+                 port: int = 27017,
+                 db_name: str = 'my_app_db',
+                 collection_name: str = 'default_collection',
+                 username: Optional[str] = None,
+                 password: Optional[str] = None,
+                 auth_source: str = 'admin',
+                 max_pool_size: int = 100,
+                 indexes: Optional[List[Union[IndexSpec, IndexModel]]] = None,
+                 contains_datetimes: Optional[bool] = None,
+                 **kwargs):
+        """
+        Creates the async client and the storage handler. Parameters match MongoDBStorage.
+
+        :param contains_datetimes: False if the collection never stores datetimes, which skips
+                                   the timezone walk on queries and writes.
+        """
+        if AsyncMongoClient is None:
+            raise MongoDBConnectionError("AsyncMongoDBStorage requires pymongo >= 4.10 (AsyncMongoClient).")
+
+        self.connection_uri = _build_connection_uri(host, port, username, password, auth_source)
+        self._indexes = indexes
+        self._needs_tz_walk = contains_datetimes is not False
+
+        self.client = AsyncMongoClient(
+            self.connection_uri,
+            maxPoolSize=max_pool_size,
+            connectTimeoutMS=3000,
+            serverSelectionTimeoutMS=5000,
+            tz_aware=True,
+            **kwargs
+        )
+        self.db = self.client[db_name]
+        collection = self.db[collection_name]
+        self.collection = collection.with_options(codec_options=_local_codec_options(collection.codec_options))
+
+    async def connect(self) -> None:
+        """Verifies the connection and ensures the configured indexes."""
+        try:
+            await self.client.admin.command('ping')
+            logger.info("MongoDB async connection successful.")
+        except PyMongoError as e:
+            logger.critical(f"MongoDB connection failed: {e}")
+            raise MongoDBConnectionError(f"Failed to connect to MongoDB: {e}") from e
+
+        if self._indexes:
+            try:
+                await self.collection.create_indexes(_to_index_models(self._indexes))
+                logger.info(f"Indexes ensured for collection '{self.collection.name}'.")
+            except PyMongoError as e:
+                logger.error(f"Failed to create indexes: {e}")
+                raise MongoDBOperationError(f"Index creation failed: {e}") from e
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # --- CRUD Methods ---
+
+    async def insert(self, data: Dict[str, Any], **kwargs) -> str:
+        """Inserts a single document, converting any datetimes to UTC. Returns the string _id."""
+        try:
+            result = await self.collection.insert_one(_normalize_document(data, self._needs_tz_walk), **kwargs)
+            return str(result.inserted_id)
+        except PyMongoError as e:
+            logger.error(f"Insert operation failed: {e}")
+            raise MongoDBOperationError from e
+
+    async def bulk_insert(self,
+                          data_list: Iterable[Dict[str, Any]],
+                          bypass_document_validation: bool = False,
+                          **kwargs) -> List[str]:
+        """
+        Inserts multiple documents in unordered insert_many chunks of BULK_INSERT_CHUNK_SIZE.
+        Returns a list of string representations of the inserted _ids.
+        """
+        inserted_ids = []
+        documents = (_normalize_document(doc, self._needs_tz_walk) for doc in data_list)
+        try:
+            while True:
+                chunk = list(itertools.islice(documents, BULK_INSERT_CHUNK_SIZE))
+                if not chunk:
+                    break
+                result = await self.collection.insert_many(
+                    chunk, ordered=False, bypass_document_validation=bypass_document_validation, **kwargs)
+                inserted_ids.extend(str(id) for id in result.inserted_ids)
+            return inserted_ids
+        except PyMongoError as e:
+            logger.error(f"Bulk insert operation failed: {e}")
+            raise MongoDBOperationError from e
+
+    async def find_one(self, query_dict: Dict[str, Any], **kwargs) -> Optional[Dict]:
+        """Finds a single document, with the same query and result conversions as MongoDBStorage."""
+        processed_query = _prep_query(query_dict, self._needs_tz_walk)
+        if processed_query is None:
+            return None  # No document can match an invalid ID format
+        try:
+            document = await self.collection.find_one(processed_query, **kwargs)
+            return _stringify_id(document) if document else None
+        except PyMongoError as e:
+            logger.error(f"Find_one operation failed: {e}")
+            raise MongoDBOperationError from e
+
+    async def find_many(self,
+                        query_dict: Dict[str, Any],
+                        sort: Optional[IndexSpec] = None,
+                        limit: int = 0,
+                        **kwargs) -> List[Dict]:
+        """Finds multiple documents with sorting and limit options."""
+        return [doc async for doc in self.iter_find(query_dict, sort, limit, **kwargs)]
+
+    async def iter_find(self,
+                        query_dict: Dict[str, Any],
+                        sort: Optional[IndexSpec] = None,
+                        limit: int = 0,
+                        batch_size: int = 1000,
+                        **kwargs) -> AsyncIterator[Dict]:
+        """Lazy variant of find_many: yields processed documents while the cursor streams."""
+        processed_query = _prep_query(query_dict, self._needs_tz_walk)
+        if processed_query is None:
+            return  # No document can match an invalid ID format
+
+        cursor = None
+        try:
+            cursor = self.collection.find(processed_query, batch_size=batch_size, **kwargs)
+
+            if sort:
+                cursor = cursor.sort(sort)
+            if limit > 0:
+                cursor = cursor.limit(limit)
+
+            async for doc in cursor:
+                yield _stringify_id(doc)
+        except PyMongoError as e:
+            logger.error(f"Find_many operation failed: {e}")
+            raise MongoDBOperationError from e
+        finally:
+            if cursor is not None:
+                await cursor.close()
+
+    async def update(self, filter_query: Dict[str, Any], update_data: Dict[str, Any], **kwargs) -> Tuple[int, int]:
+        """Updates documents matching the filter. Returns (matched_count, modified_count)."""
+        processed_filter = _prep_query(filter_query, self._needs_tz_walk)
+        if processed_filter is None:
+            return 0, 0
+        processed_update = _as_update_document(_normalize_input(update_data, needs_tz_walk=self._needs_tz_walk))
+        try:
+            result = await self.collection.update_many(processed_filter, processed_update, **kwargs)
+            return result.matched_count, result.modified_count
+        except PyMongoError as e:
+            logger.error(f"Update operation failed: {e}")
+            raise MongoDBOperationError from e
+
+    async def bulk_update(self,
+                          operations: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                          bypass_document_validation: bool = False,
+                          **kwargs) -> Tuple[int, int]:
+        """
+        Applies multiple (filter, update) pairs in a single unordered bulk_write round trip.
+        Pairs whose filter has an invalid string _id are skipped, as they cannot match.
+        """
+        requests = []
+        for filter_query, update_data in operations:
+            processed_filter = _prep_query(filter_query, self._needs_tz_walk)
+            if processed_filter is None:
+                continue  # Cannot match anything, skip the operation
+            requests.append(UpdateMany(processed_filter, _as_update_document(
+                _normalize_input(update_data, needs_tz_walk=self._needs_tz_walk))))
+
+        if not requests:
+            return 0, 0
+
+        try:
+            result = await self.collection.bulk_write(
+                requests, ordered=False, bypass_document_validation=bypass_document_validation, **kwargs)
+            return result.matched_count, result.modified_count
+        except PyMongoError as e:
+            logger.error(f"Bulk update operation failed: {e}")
+            raise MongoDBOperationError from e
+
+    # --- Advanced Query Methods ---
+
+    async def count_documents(self, query_dict: Dict[str, Any], **kwargs) -> int:
+        """Counts documents matching the query."""
+        processed_query = _prep_query(query_dict, self._needs_tz_walk)
+        if processed_query is None:
+            return 0
+        try:
+            return await self.collection.count_documents(processed_query, **kwargs)
+        except PyMongoError as e:
+            logger.error(f"Count_documents operation failed: {e}")
+            raise MongoDBOperationError from e
+
+    async def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> List[Dict]:
+        """
+        Executes an aggregation pipeline. As with MongoDBStorage, string '_id's in
+        the pipeline are not converted; provide ObjectIds directly in stages like $match.
+        """
+        try:
+            processed_pipeline = _normalize_input(pipeline, needs_tz_walk=self._needs_tz_walk)
+            cursor = await self.collection.aggregate(processed_pipeline, **kwargs)
+            return [_stringify_id(doc) async for doc in cursor]
+        except PyMongoError as e:
+            logger.error(f"Aggregation operation failed: {e}")
+            raise MongoDBOperationError from e
+
+    async def close(self) -> None:
+        """Closes the async client."""
+        await self.client.close()
+        logger.info("MongoDB async connection closed.")
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 def run_test_suite():
@@ -625,7 +1477,13 @@ def run_test_suite():
         storage = MongoDBStorage(
             db_name="test_db",
             collection_name="test_collection",
-            indexes=[[("event_time", DESCENDING)]]
+            indexes=[
+                [("event_time", DESCENDING)],
+                # Serves the $match of the aggregation test. Partial: only categorized documents
+                # are indexed, the query must repeat the {"$exists": True} filter to be eligible.
+                IndexModel([("event_time", ASCENDING), ("category", ASCENDING)],
+                           partialFilterExpression={"category": {"$exists": True}}),
+            ]
         )
         storage.collection.delete_many({})
 
@@ -635,6 +1493,16 @@ def run_test_suite():
         print("\n--- Testing Advanced Queries ---")
         _test_advanced_queries(storage, inserted_id)
 
+        print("\n--- Testing Query Cache ---")
+        _test_query_cache(storage)
+
+        print("\n--- Testing Export ---")
+        _test_export(storage, inserted_id)
+
+        if AsyncMongoClient is not None:
+            print("\n--- Testing Async Storage ---")
+            asyncio.run(_test_async_storage())
+
     except MongoDBError as e:
         print(f"\n[✗] A test failed with a MongoDB error: {e}")
     except Exception as e:
@@ -684,6 +1552,10 @@ def _test_timezone_handling(storage: MongoDBStorage) -> str:
 
     assert found_doc is not None, "find_one returned None for a valid ID"
     assert found_doc["event_time"] == local_time_expected, "Stored time did not convert back to local correctly"
+    # Every read path must return the same zone object (find_one converts in Python, find_many in the C decoder)
+    found_many = storage.find_many({"_id": inserted_id})
+    assert found_doc["event_time"].tzinfo is LOCAL_TZ, "find_one did not return LOCAL_TZ datetimes"
+    assert found_many[0]["event_time"].tzinfo is LOCAL_TZ, "find_many did not return LOCAL_TZ datetimes"
     print(f"[✓] Verified datetimes convert to local time on read.")
     return inserted_id
 
@@ -727,6 +1599,87 @@ def _test_advanced_queries(storage: MongoDBStorage, base_doc_id: str):
     print(f"    Aggregation result: {results}")
 
 
+def _test_query_cache(storage: MongoDBStorage):
+    """Tests that cached counts are served until a write invalidates them."""
+    query = {"category": "C"}
+    assert storage.count_documents(query, cache=True) == 0
+
+    # Bypass the storage handler so the cache is not invalidated
+    storage.collection.insert_one({"category": "C"})
+    assert storage.count_documents(query, cache=True) == 0, "Cached count should be served"
+    assert storage.count_documents(query) == 1, "Uncached count should hit the database"
+
+    storage.insert({"category": "C"})
+    assert storage.count_documents(query, cache=True) == 2, "Write should invalidate the cache"
+
+    # A write through another handler of the same collection invalidates this handler's cache too
+    other = MongoDBStorage(db_name=storage.db.name, collection_name=storage.collection.name)
+    try:
+        other.insert({"category": "C"})
+        assert storage.count_documents(query, cache=True) == 3, "Write through another handler should invalidate"
+    finally:
+        other.close()
+    print("[✓] Query cache serves repeated queries and is invalidated by writes.")
+
+
+def _test_export(storage: MongoDBStorage, base_doc_id: str):
+    """Tests the streaming export: file content, empty ranges and month splitting."""
+    naive_time = datetime.datetime(2025, 10, 18, 15, 0, 0)
+    # Late on the last local day of October: already November in UTC for timezones west of UTC
+    boundary_time = datetime.datetime(2025, 10, 31, 23, 30, tzinfo=LOCAL_TZ)
+    boundary_id = storage.insert({"description": "month boundary", "event_time": boundary_time})
+
+    with tempfile.TemporaryDirectory() as directory:
+        # 1. Exported file is valid JSON, _id is a hex string and datetimes are local
+        path = storage.export_by_time_range(
+            datetime.datetime(2025, 10, 18), datetime.datetime(2025, 10, 19), directory, time_field="event_time")
+        assert path and os.path.isfile(path), "Export did not produce a file"
+        with open(path, 'r', encoding='utf-8') as f:
+            exported = json.load(f)
+        assert [doc["_id"] for doc in exported] == [base_doc_id], f"Unexpected export content: {exported}"
+        ObjectId(exported[0]["_id"])  # Raises if not a valid hex id
+        exported_time = datetime.datetime.fromisoformat(exported[0]["event_time"])
+        local_time_expected = naive_time.replace(tzinfo=LOCAL_TZ)
+        assert exported_time == local_time_expected, "Exported datetime does not match the stored moment"
+        assert exported_time.utcoffset() == local_time_expected.utcoffset(), "Exported datetime is not local time"
+        os.remove(path)
+        print("[✓] Export writes valid JSON with hex string ids and local datetimes.")
+
+        # 2. Empty range: no file and no temp file left behind
+        path = storage.export_by_time_range(
+            datetime.datetime(2000, 1, 1), datetime.datetime(2000, 1, 2), directory, time_field="event_time")
+        assert path == "", f"Empty range should return an empty path, got {path}"
+        assert not os.listdir(directory), f"Empty export left files behind: {os.listdir(directory)}"
+        print("[✓] Empty range export returns no path and leaves no file.")
+
+        # 3. Month split puts the boundary document into its local month
+        paths = storage.export_all(directory, split_by='month', time_field="event_time")
+        october = [p for p in paths if Path(p).name == "monthly_2025_10.json"]
+        assert len(october) == 1, f"October export missing: {paths}"
+        with open(october[0], 'r', encoding='utf-8') as f:
+            october_ids = {doc["_id"] for doc in json.load(f)}
+        assert boundary_id in october_ids, "Month boundary document missing from its local month"
+        assert not [name for name in os.listdir(directory) if name.endswith('.tmp')], "Temp files left behind"
+        print(f"[✓] Monthly export covers the month boundary. Files: {[Path(p).name for p in paths]}")
+
+
+async def _test_async_storage():
+    """Tests that AsyncMongoDBStorage converts like MongoDBStorage and serves concurrent queries."""
+    async with AsyncMongoDBStorage(db_name="test_db", collection_name="test_collection_async") as storage:
+        try:
+            await storage.collection.delete_many({})
+            naive_time = datetime.datetime(2025, 10, 18, 15, 0, 0)
+            ids = await storage.bulk_insert({"seq": i, "event_time": naive_time} for i in range(5))
+
+            docs = await asyncio.gather(*[storage.find_one({"_id": doc_id}) for doc_id in ids])
+            assert [doc["_id"] for doc in docs] == ids, "Concurrent find_one returned wrong documents"
+            assert docs[0]["event_time"] == naive_time.replace(tzinfo=LOCAL_TZ), "Datetime not converted to local"
+            assert await storage.count_documents({"event_time": naive_time}) == 5
+            print("[✓] Async storage handles concurrent queries with timezone conversion.")
+        finally:
+            await storage.collection.delete_many({})
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     run_test_suite()